@@ -1,48 +1,93 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
+import asyncio
 import os
 from dotenv import load_dotenv
 load_dotenv()
-from routes import planner
 from models import HealthResponse
 
 
 
+async def warm_semantic_cache():
+    """Warm the semantic cache; runs as a background task so startup is not blocked."""
+    from routes import planner
+    
+    try:
+        await planner.warm_semantic_cache()
+    except Exception as e:
+        print(f"⚠️  Could not warm semantic cache: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    from services.llm_service import close_http_client
+    
     # Startup
     print("🚀 AI Holiday Planner API starting...")
+    warm_task = asyncio.create_task(warm_semantic_cache())
     yield
     # Shutdown
+    warm_task.cancel()
+    await close_http_client()
     print("👋 AI Holiday Planner API shutting down...")
 
 
-app = FastAPI(
-    title="AI Holiday Planner API",
-    description="An intelligent holiday planning API powered by Cerebras LLM",
-    version="1.0.0",
-    lifespan=lifespan
-)
+# CORS middleware (credentialed requests need explicit origins, not "*")
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("CORS_ORIGINS", "http://localhost:4200").split(",")
+    if origin.strip()
+]
 
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
 
-# Health check endpoint
-@app.get("/health", response_model=HealthResponse, tags=["Health"])
-async def health_check():
-    """Health check endpoint to verify API is running."""
-    return HealthResponse(status="healthy", message="API is running successfully")
+def create_app() -> FastAPI:
+    """Build the API. Importing the routes creates the LLM service and its Redis/HTTP clients."""
+    from routes import planner
+    
+    app = FastAPI(
+        title="AI Holiday Planner API",
+        description="An intelligent holiday planning API powered by Cerebras LLM",
+        version="1.0.0",
+        lifespan=lifespan,
+        default_response_class=ORJSONResponse
+    )
+    
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=CORS_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["GET", "POST", "DELETE"],
+        allow_headers=["content-type", "authorization"],
+        max_age=86400,  # let browsers cache preflight responses for a day
+    )
+    
+    # Health check endpoint
+    @app.get("/health", response_model=HealthResponse, tags=["Health"])
+    async def health_check():
+        """Health check endpoint to verify API is running."""
+        return HealthResponse(status="healthy", message="API is running successfully")
+    
+    # Include routers
+    app.include_router(planner.router)
+    return app
 
-# Include routers
-app.include_router(planner.router)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Multiple workers require an import string rather than the app object.
+    # "auto" selects uvloop/httptools whenever they are installed (not on Windows).
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8000")),
+        workers=int(os.getenv("WEB_CONCURRENCY", "4")),
+        loop=os.getenv("UVICORN_LOOP", "auto"),
+        http=os.getenv("UVICORN_HTTP", "auto")
+    )
+else:
+    # Built only where "main:app" is imported (uvicorn/gunicorn workers), never in
+    # the `python main.py` supervisor, which would otherwise load the LLM service,
+    # its clients and any embedding model without serving a request
+    app = create_app()
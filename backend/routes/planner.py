@@ -1,7 +1,13 @@
 from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from uuid import uuid4
+import asyncio
 import re
-from typing import Dict
+from typing import AsyncIterator, Optional
+
+import orjson
+import redis.asyncio as redis
+from dotenv import set_key
 
 from models import (
     ItineraryRequest, 
@@ -14,38 +20,192 @@ from models import (
     ModelsResponse,
     ConfigUpdateRequest
 )
-from services.llm_service import LLMService
+from services.llm_service import LLMService, SEMANTIC_CACHE_ENABLED, SEMANTIC_CACHE_MAX_ENTRIES
 import os
 
 router = APIRouter(prefix="/api/v1/planner", tags=["Holiday Planner"])
 
-# In-memory session storage (consider using Redis in production)
-sessions: Dict[str, dict] = {}
+# Go up 3 levels from routes/planner.py to reach root (NewPlanner)
+ENV_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), '.env')
+
+_FOLLOWUP_HEADER = "FOLLOW-UP QUESTIONS"
+
+# Numeric list prefix on a follow-up question line, e.g. "1. "
+_NUM_PREFIX = re.compile(r'^\d+\.\s*')
+
+# Redis session storage, shared by all workers
+SESSION_TTL = int(os.getenv("SESSION_TTL_SECONDS", "86400"))  # default 24 hours
+redis_client = redis.from_url(
+    os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+    decode_responses=True
+)
+
+# Atomically append a refinement turn to a stored session (GET -> append -> SET),
+# so concurrent refinements of the same session cannot overwrite each other.
+# cjson encodes an empty table as {} rather than [], so an empty question list
+# is left out of the stored session instead (readers default it to []).
+_APPEND_TURN_LUA = """
+local raw = redis.call('GET', KEYS[1])
+if not raw then
+    return 0
+end
+local session = cjson.decode(raw)
+local turn = cjson.decode(ARGV[1])
+for _, message in ipairs(turn.history) do
+    table.insert(session.history, message)
+end
+session.current_itinerary = turn.current_itinerary
+if next(turn.follow_up_questions) == nil then
+    session.follow_up_questions = nil
+else
+    session.follow_up_questions = turn.follow_up_questions
+end
+redis.call('SET', KEYS[1], cjson.encode(session), 'EX', ARGV[2])
+return 1
+"""
+_append_turn = redis_client.register_script(_APPEND_TURN_LUA)
+
+# Keys fetched per SCAN page (and per MGET) when warming the semantic cache
+WARM_SCAN_COUNT = 500
+# Most sessions each worker loads into its semantic cache at startup
+WARM_SESSION_LIMIT = int(os.getenv("SEMANTIC_CACHE_WARM_LIMIT", str(SEMANTIC_CACHE_MAX_ENTRIES)))
 
 llm_service = LLMService()
 
 
+def _session_key(session_id: str) -> str:
+    return f"sess:{session_id}"
+
+
+async def load_session(session_id: str) -> Optional[dict]:
+    """Fetch a session and roll its expiry forward."""
+    raw = await redis_client.getex(_session_key(session_id), ex=SESSION_TTL)
+    return orjson.loads(raw) if raw is not None else None
+
+
+async def store_session(session_id: str, session: dict) -> None:
+    """Persist a session with a fresh expiry."""
+    await redis_client.set(_session_key(session_id), orjson.dumps(session), ex=SESSION_TTL)
+
+
+async def append_session_turn(session_id: str, turn: dict) -> bool:
+    """Append a turn to a session atomically, returning whether it still exists."""
+    stored = await _append_turn(keys=[_session_key(session_id)], args=[orjson.dumps(turn), SESSION_TTL])
+    return stored == 1
+
+
+def _warm_entries(raw_sessions: list) -> list:
+    """Reduce raw sessions to (provider, model, description, itinerary) tuples."""
+    entries = []
+    for raw in raw_sessions:
+        if raw is None:
+            continue
+        session = orjson.loads(raw)
+        history = session.get("history", [])
+        if len(history) >= 2:
+            entries.append((
+                session.get("provider", "cerebras"),
+                session.get("model", "llama-3.3-70b"),
+                history[0]["content"],
+                history[1]["content"]
+            ))
+    return entries
+
+
+async def warm_semantic_cache() -> None:
+    """Load the initial itinerary of stored sessions (up to WARM_SESSION_LIMIT) into the semantic cache."""
+    if not SEMANTIC_CACHE_ENABLED or WARM_SESSION_LIMIT <= 0:
+        return
+    
+    entries = []
+    batch = []
+    # One MGET per SCAN page rather than a GET round-trip per key. Each page is
+    # parsed as it arrives so only the first request and itinerary are kept
+    async for key in redis_client.scan_iter(match=_session_key("*"), count=WARM_SCAN_COUNT):
+        if len(entries) >= WARM_SESSION_LIMIT:
+            break
+        batch.append(key)
+        if len(batch) >= WARM_SCAN_COUNT:
+            entries.extend(_warm_entries(await redis_client.mget(batch)))
+            batch.clear()
+    if batch:
+        entries.extend(_warm_entries(await redis_client.mget(batch)))
+    del entries[WARM_SESSION_LIMIT:]
+    
+    # Batch embedding is CPU-bound, keep it off the event loop
+    warmed = await asyncio.to_thread(llm_service.warm_semantic_cache, entries)
+    print(f"🧠 Semantic cache warmed with {warmed} itineraries")
+
+
+def new_session(
+    description: str,
+    itinerary: str,
+    follow_up_questions: list[FollowUpQuestion],
+    provider: str,
+    model: str
+) -> dict:
+    """Build the stored state for a freshly generated itinerary."""
+    return {
+        "initial_description": description,
+        "current_itinerary": itinerary,
+        "follow_up_questions": [q.model_dump() for q in follow_up_questions],
+        "provider": provider,
+        "model": model,
+        "history": [
+            {"role": "user", "content": description},
+            {"role": "assistant", "content": itinerary}
+        ]
+    }
+
+
+async def drop_session(session_id: str) -> bool:
+    """Delete a session, returning whether it existed."""
+    return await redis_client.delete(_session_key(session_id)) > 0
+
+
+def build_refinement_prompt(feedback: str) -> str:
+    """Wrap user feedback into the refinement instruction sent to the LLM."""
+    return f"Based on my previous request and your itinerary, here's my feedback/answer: {feedback}\n\nPlease refine the itinerary accordingly and include updated FOLLOW-UP QUESTIONS at the end."
+
+
+def refinement_turn(refinement_prompt: str, itinerary: str, follow_up_questions: list[FollowUpQuestion]) -> dict:
+    """Build the session update appended after a refinement."""
+    return {
+        "current_itinerary": itinerary,
+        "follow_up_questions": [q.model_dump() for q in follow_up_questions],
+        "history": [
+            {"role": "user", "content": refinement_prompt},
+            {"role": "assistant", "content": itinerary}
+        ]
+    }
+
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Format a Server-Sent Events message with a JSON payload."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {orjson.dumps(data).decode()}\n\n"
+
+
 def extract_follow_up_questions(itinerary_text: str) -> list[FollowUpQuestion]:
     """Extract follow-up questions from the itinerary text."""
     questions = []
     
-    # Look for FOLLOW-UP QUESTIONS section
-    if "FOLLOW-UP QUESTIONS" in itinerary_text:
-        section = itinerary_text.split("FOLLOW-UP QUESTIONS")[-1]
-        
-        # Extract questions (numbered or bulleted)
-        question_pattern = r'[•\-\*]?\s*(\d+\.)?\s*(.+?)(?=\n[•\-\*\d]|\Z)'
-        matches = re.findall(question_pattern, section, re.MULTILINE | re.DOTALL)
-        
-        for idx, match in enumerate(matches, 1):
-            question_text = match[1].strip()
-            if question_text and len(question_text) > 5:
-                questions.append(FollowUpQuestion(
-                    question=question_text,
-                    order=idx
-                ))
+    # Look for the last FOLLOW-UP QUESTIONS section
+    idx = itinerary_text.rfind(_FOLLOWUP_HEADER)
+    if idx == -1:
+        return questions
+    section = itinerary_text[idx + len(_FOLLOWUP_HEADER):]
+    
+    # Extract questions (numbered or bulleted), one per line
+    for line in section.splitlines():
+        question_text = _NUM_PREFIX.sub('', line.lstrip(" •-*\t").lstrip(), count=1).strip()
+        if question_text and len(question_text) > 5:
+            questions.append(FollowUpQuestion.model_construct(
+                question=question_text,
+                order=len(questions) + 1
+            ))
     
-    return questions if questions else []
+    return questions
 
 
 @router.get(
@@ -81,7 +241,7 @@ async def generate_itinerary(request: ItineraryRequest):
         session_id = str(uuid4())
         
         # Generate itinerary
-        itinerary = llm_service.generate_itinerary(
+        itinerary = await llm_service.agenerate_itinerary(
             request.description, 
             request.provider, 
             request.model
@@ -91,18 +251,12 @@ async def generate_itinerary(request: ItineraryRequest):
         follow_up_questions = extract_follow_up_questions(itinerary)
         
         # Store session
-        sessions[session_id] = {
-            "initial_description": request.description,
-            "current_itinerary": itinerary,
-            "provider": request.provider,
-            "model": request.model,
-            "history": [
-                {"role": "user", "content": request.description},
-                {"role": "assistant", "content": itinerary}
-            ]
-        }
+        await store_session(
+            session_id,
+            new_session(request.description, itinerary, follow_up_questions, request.provider, request.model)
+        )
         
-        return ItineraryResponse(
+        return ItineraryResponse.model_construct(
             session_id=session_id,
             itinerary=itinerary,
             follow_up_questions=follow_up_questions,
@@ -116,6 +270,61 @@ async def generate_itinerary(request: ItineraryRequest):
         raise HTTPException(status_code=500, detail=f"Error generating itinerary: {str(e)}")
 
 
+@router.post(
+    "/generate/stream",
+    responses={
+        200: {"content": {"text/event-stream": {}}, "description": "Itinerary streamed as Server-Sent Events"},
+        400: {"model": ErrorResponse, "description": "Invalid request"}
+    }
+)
+async def generate_itinerary_stream(request: ItineraryRequest):
+    """
+    Stream a new holiday itinerary as Server-Sent Events.
+    
+    Emits `data: {"delta": ...}` messages as tokens arrive, then a final `done`
+    event carrying the full ItineraryResponse once the session is stored.
+    """
+    try:
+        chunks = llm_service.astream_itinerary(
+            request.description,
+            request.provider,
+            request.model
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async def event_gen() -> AsyncIterator[str]:
+        session_id = str(uuid4())
+        buffer = []
+        
+        try:
+            async for delta in chunks:
+                buffer.append(delta)
+                yield sse_event({"delta": delta})
+            
+            itinerary = "".join(buffer)
+            follow_up_questions = extract_follow_up_questions(itinerary)
+            
+            await store_session(
+                session_id,
+                new_session(request.description, itinerary, follow_up_questions, request.provider, request.model)
+            )
+            
+            response = ItineraryResponse.model_construct(
+                session_id=session_id,
+                itinerary=itinerary,
+                follow_up_questions=follow_up_questions,
+                provider=request.provider,
+                model=request.model
+            )
+            yield sse_event(response.model_dump(), event="done")
+        
+        except Exception as e:
+            yield sse_event({"error": f"Error generating itinerary: {str(e)}"}, event="error")
+    
+    return StreamingResponse(event_gen(), media_type="text/event-stream")
+
+
 @router.post(
     "/refine",
     response_model=ItineraryResponse,
@@ -130,33 +339,36 @@ async def refine_itinerary(request: RefinementRequest):
     """
     try:
         # Verify session exists
-        if request.session_id not in sessions:
+        session = await load_session(request.session_id)
+        if session is None:
             raise HTTPException(status_code=400, detail=f"Session '{request.session_id}' not found")
         
-        session = sessions[request.session_id]
         provider = session.get("provider", "cerebras")
         model = session.get("model", "llama-3.3-70b")
         
         # Build refinement prompt
-        refinement_prompt = f"Based on my previous request and your itinerary, here's my feedback/answer: {request.feedback}\n\nPlease refine the itinerary accordingly and include updated FOLLOW-UP QUESTIONS at the end."
+        refinement_prompt = build_refinement_prompt(request.feedback)
         
         # Generate refined itinerary with context
-        refined_itinerary = llm_service.refine_itinerary(
+        refined_itinerary = await llm_service.arefine_itinerary(
             refinement_prompt,
             session["history"],
             provider,
             model
         )
         
-        # Update session
-        session["current_itinerary"] = refined_itinerary
-        session["history"].append({"role": "user", "content": refinement_prompt})
-        session["history"].append({"role": "assistant", "content": refined_itinerary})
-        
         # Extract follow-up questions
         follow_up_questions = extract_follow_up_questions(refined_itinerary)
         
-        return ItineraryResponse(
+        # Update session
+        stored = await append_session_turn(
+            request.session_id,
+            refinement_turn(refinement_prompt, refined_itinerary, follow_up_questions)
+        )
+        if not stored:
+            raise HTTPException(status_code=400, detail=f"Session '{request.session_id}' not found")
+        
+        return ItineraryResponse.model_construct(
             session_id=request.session_id,
             itinerary=refined_itinerary,
             follow_up_questions=follow_up_questions,
@@ -170,6 +382,71 @@ async def refine_itinerary(request: RefinementRequest):
         raise HTTPException(status_code=500, detail=f"Error refining itinerary: {str(e)}")
 
 
+@router.post(
+    "/refine/stream",
+    responses={
+        200: {"content": {"text/event-stream": {}}, "description": "Refined itinerary streamed as Server-Sent Events"},
+        400: {"model": ErrorResponse, "description": "Invalid request or session not found"}
+    }
+)
+async def refine_itinerary_stream(request: RefinementRequest):
+    """
+    Stream a refined itinerary as Server-Sent Events.
+    
+    Same event format as /generate/stream.
+    """
+    session = await load_session(request.session_id)
+    if session is None:
+        raise HTTPException(status_code=400, detail=f"Session '{request.session_id}' not found")
+    
+    provider = session.get("provider", "cerebras")
+    model = session.get("model", "llama-3.3-70b")
+    refinement_prompt = build_refinement_prompt(request.feedback)
+    
+    try:
+        chunks = llm_service.astream_refinement(
+            refinement_prompt,
+            session["history"],
+            provider,
+            model
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async def event_gen() -> AsyncIterator[str]:
+        buffer = []
+        
+        try:
+            async for delta in chunks:
+                buffer.append(delta)
+                yield sse_event({"delta": delta})
+            
+            refined_itinerary = "".join(buffer)
+            follow_up_questions = extract_follow_up_questions(refined_itinerary)
+            
+            stored = await append_session_turn(
+                request.session_id,
+                refinement_turn(refinement_prompt, refined_itinerary, follow_up_questions)
+            )
+            if not stored:
+                yield sse_event({"error": f"Session '{request.session_id}' not found"}, event="error")
+                return
+            
+            response = ItineraryResponse.model_construct(
+                session_id=request.session_id,
+                itinerary=refined_itinerary,
+                follow_up_questions=follow_up_questions,
+                provider=provider,
+                model=model
+            )
+            yield sse_event(response.model_dump(), event="done")
+        
+        except Exception as e:
+            yield sse_event({"error": f"Error refining itinerary: {str(e)}"}, event="error")
+    
+    return StreamingResponse(event_gen(), media_type="text/event-stream")
+
+
 @router.post(
     "/save",
     response_model=SaveItineraryResponse,
@@ -184,10 +461,10 @@ async def save_itinerary(request: SaveItineraryRequest, background_tasks: Backgr
     """
     try:
         # Verify session exists
-        if request.session_id not in sessions:
+        session = await load_session(request.session_id)
+        if session is None:
             raise HTTPException(status_code=400, detail=f"Session '{request.session_id}' not found")
         
-        session = sessions[request.session_id]
         itinerary_content = session["current_itinerary"]
         
         # Generate filename
@@ -220,14 +497,17 @@ async def get_session(session_id: str):
     """
     Retrieve the current state of a session.
     """
-    if session_id not in sessions:
+    session = await load_session(session_id)
+    if session is None:
         raise HTTPException(status_code=400, detail=f"Session '{session_id}' not found")
     
-    session = sessions[session_id]
     itinerary = session["current_itinerary"]
-    follow_up_questions = extract_follow_up_questions(itinerary)
+    # Questions are extracted once when the itinerary is written; stored data is
+    # already validated, so responses are built with model_construct. The field is
+    # absent when the latest turn had no questions (see _APPEND_TURN_LUA)
+    follow_up_questions = [FollowUpQuestion.model_construct(**q) for q in session.get("follow_up_questions", [])]
     
-    return ItineraryResponse(
+    return ItineraryResponse.model_construct(
         session_id=session_id,
         itinerary=itinerary,
         follow_up_questions=follow_up_questions,
@@ -239,53 +519,24 @@ async def get_session(session_id: str):
 @router.delete("/sessions/{session_id}")
 async def delete_session(session_id: str):
     """Delete a session and its data."""
-    if session_id not in sessions:
+    if not await drop_session(session_id):
         raise HTTPException(status_code=400, detail=f"Session '{session_id}' not found")
     
-    del sessions[session_id]
     return {"message": f"Session '{session_id}' deleted successfully"}
 
 
+def _write_default_model(provider: str, model: str) -> None:
+    """Update DEFAULT_PROVIDER/DEFAULT_MODEL in place in the .env file."""
+    set_key(ENV_PATH, 'DEFAULT_PROVIDER', provider, quote_mode='never')
+    set_key(ENV_PATH, 'DEFAULT_MODEL', model, quote_mode='never')
+
+
 @router.post("/config/model")
 async def update_model_config(request: ConfigUpdateRequest):
     """Update the default model configuration in .env file."""
     try:
-        # Go up 3 levels from routes/planner.py to reach root (NewPlanner)
-        env_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.env')
-        
-        # Read current .env content
-        if os.path.exists(env_path):
-            with open(env_path, 'r') as f:
-                lines = f.readlines()
-        else:
-            lines = []
-        
-        # Update or add variables
-        new_lines = []
-        provider_updated = False
-        model_updated = False
-        
-        for line in lines:
-            if line.startswith('DEFAULT_PROVIDER='):
-                new_lines.append(f'DEFAULT_PROVIDER={request.provider}\n')
-                provider_updated = True
-            elif line.startswith('DEFAULT_MODEL='):
-                new_lines.append(f'DEFAULT_MODEL={request.model}\n')
-                model_updated = True
-            else:
-                new_lines.append(line)
-        
-        if not provider_updated:
-            new_lines.append(f'DEFAULT_PROVIDER={request.provider}\n')
-        if not model_updated:
-            new_lines.append(f'DEFAULT_MODEL={request.model}\n')
-            
-        # Write back to .env
-        with open(env_path, 'w') as f:
-            f.writelines(new_lines)
-            
+        await asyncio.to_thread(_write_default_model, request.provider, request.model)
         return {"status": "success", "message": "Configuration updated successfully"}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating configuration: {str(e)}")
-
@@ -1,7 +1,19 @@
+import asyncio
+import hashlib
+import json
 import os
-from typing import List, Dict, Any
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from typing import AsyncIterator, Final, Iterable, Iterator, List, Dict, Any, Mapping, Optional, Tuple
+import aiofiles
+import httpx
 from langchain_cerebras import ChatCerebras
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from services.semantic_cache import SemanticCache
 
 # Optional imports for other providers
 try:
@@ -14,17 +26,41 @@ try:
 except ImportError:
     ChatGroq = None
 
+# Refinements re-send at most this many recent messages verbatim (within a character
+# budget); older turns are folded into a short summary of the user's requests
+MAX_HISTORY_MESSAGES = 6
+MAX_HISTORY_CHARS = 8000
+MAX_SUMMARY_CHARS = 2000
 
-class LLMService:
-    """Service for handling LLM interactions with multiple providers."""
-    
-    def __init__(self):
-        """Initialize the LLM service."""
-        self.system_prompt = self._create_system_prompt()
-    
-    def _create_system_prompt(self) -> str:
-        """Create the system prompt for holiday planning."""
-        return """You are a PROFESSIONAL TRAVEL ITINERARY DESIGNER and ON-GROUND TRIP PLANNER with real-world experience of how travelers actually move, rest, eat, and explore destinations.
+LLM_TEMPERATURE = 0.7
+
+# Exact-match response cache; only safe for deterministic output (temperature 0)
+# unless explicitly enabled
+RESPONSE_CACHE_SIZE = 256
+RESPONSE_CACHE_ENABLED = os.getenv("LLM_RESPONSE_CACHE", "false").lower() == "true" or LLM_TEMPERATURE == 0
+
+# Semantic (embedding similarity) cache for initial itineraries; opt-in as it loads an embedding model
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+# Itineraries kept per provider/model in each worker; the oldest are evicted first
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+# int8 embeddings: ~4x less memory per cached itinerary, ~2x slower lookups
+SEMANTIC_CACHE_INT8 = os.getenv("SEMANTIC_CACHE_INT8", "false").lower() == "true"
+
+# Shared async HTTP client so all providers reuse pooled keep-alive (HTTP/2) connections
+_HTTPX = httpx.AsyncClient(
+    http2=True,
+    timeout=60,
+    limits=httpx.Limits(max_keepalive_connections=64, max_connections=128)
+)
+
+
+async def close_http_client() -> None:
+    """Close the shared HTTP client."""
+    await _HTTPX.aclose()
+
+
+_SYSTEM_PROMPT: Final[str] = """You are a PROFESSIONAL TRAVEL ITINERARY DESIGNER and ON-GROUND TRIP PLANNER with real-world experience of how travelers actually move, rest, eat, and explore destinations.
 
 Your task is to create HIGHLY PRACTICAL, REALISTIC, and EXECUTABLE itineraries — NOT generic tourism lists.
 
@@ -172,110 +208,405 @@ TONE & THINKING STYLE
 - Write as if the user will follow this plan step-by-step.
 
 Your goal is NOT to impress — your goal is to HELP the traveler have a smooth, stress-free, and memorable trip."""
+
+# Built once and shared by every request. The system prompt is always the first
+# message and byte-identical, so providers with automatic prefix caching
+# (OpenAI, Groq) can reuse its prefill across requests.
+_SYSTEM_MSG = SystemMessage(content=_SYSTEM_PROMPT)
+
+# Routes OpenAI requests sharing this prompt to the same prompt cache; changes
+# whenever the prompt text changes
+_PROMPT_CACHE_KEY = f"planner-{hashlib.sha256(_SYSTEM_PROMPT.encode()).hexdigest()[:16]}"
+
+
+def _frozen_provider(provider: str, name: str, models: List[Tuple[str, str]]) -> Mapping[str, Any]:
+    """Read-only provider entry, safe to share between requests."""
+    return MappingProxyType({
+        "provider": provider,
+        "name": name,
+        "models": tuple(MappingProxyType({"id": model_id, "name": model_name}) for model_id, model_name in models)
+    })
+
+
+# (API key env var, client class, provider entry) for every supported provider
+_PROVIDER_CATALOG = (
+    ("CEREBRAS_API_KEY", ChatCerebras, _frozen_provider("cerebras", "Cerebras", [
+        ("llama-3.3-70b", "Llama 3.3 70B")
+    ])),
+    ("OPENAI_API_KEY", ChatOpenAI, _frozen_provider("openai", "OpenAI", [
+        ("gpt-4o", "GPT-4o"),
+        ("gpt-3.5-turbo", "GPT-3.5 Turbo")
+    ])),
+    ("GROQ_API_KEY", ChatGroq, _frozen_provider("groq", "Groq", [
+        ("llama3-70b-8192", "Llama 3 70B"),
+        ("mixtral-8x7b-32768", "Mixtral 8x7B")
+    ])),
+)
+
+
+class LLMService:
+    """Service for handling LLM interactions with multiple providers."""
+    
+    def __init__(self):
+        """Initialize the LLM service."""
+        self.system_prompt = _SYSTEM_PROMPT
+        self._llm_cache: Dict[Tuple[str, str], BaseChatModel] = {}
+        self._llm_lock = threading.Lock()
+        self._providers_cache = self._compute_providers()
+        self._response_cache: "OrderedDict[str, str]" = OrderedDict()
+        self._response_cache_lock = threading.Lock()
+        self._semantic_cache = self._create_semantic_cache()
+    
+    @staticmethod
+    def _create_semantic_cache() -> Optional[SemanticCache]:
+        """Create the semantic cache if enabled and its dependencies are installed."""
+        if not SEMANTIC_CACHE_ENABLED:
+            return None
+        try:
+            return SemanticCache(
+                threshold=SEMANTIC_CACHE_THRESHOLD,
+                max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+                quantize=SEMANTIC_CACHE_INT8
+            )
+        except ImportError as e:
+            print(f"⚠️  Semantic cache disabled: {e}")
+            return None
     
-    def get_available_providers(self) -> List[Dict[str, Any]]:
-        """Get list of available providers and their models based on API keys."""
-        providers = []
+    def warm_semantic_cache(self, entries: Iterable[Tuple[str, str, str, str]]) -> int:
+        """
+        Pre-populate the semantic cache from (provider, model, description, itinerary) tuples.
         
-        # Cerebras
-        if os.getenv("CEREBRAS_API_KEY"):
-            providers.append({
-                "provider": "cerebras",
-                "name": "Cerebras",
-                "models": [
-                    {"id": "llama-3.3-70b", "name": "Llama 3.3 70B"}
-                ]
-            })
-            
-        # OpenAI
-        if os.getenv("OPENAI_API_KEY") and ChatOpenAI:
-            providers.append({
-                "provider": "openai",
-                "name": "OpenAI",
-                "models": [
-                    {"id": "gpt-4o", "name": "GPT-4o"},
-                    {"id": "gpt-3.5-turbo", "name": "GPT-3.5 Turbo"}
-                ]
-            })
-            
-        # Groq
-        if os.getenv("GROQ_API_KEY") and ChatGroq:
-            providers.append({
-                "provider": "groq",
-                "name": "Groq",
-                "models": [
-                    {"id": "llama3-70b-8192", "name": "Llama 3 70B"},
-                    {"id": "mixtral-8x7b-32768", "name": "Mixtral 8x7B"}
-                ]
-            })
-            
-        return providers
-
-    def _create_llm(self, provider: str, model: str):
+        Returns the number of itineraries loaded (0 when the semantic cache is disabled).
+        """
+        if self._semantic_cache is None:
+            return 0
+        
+        by_namespace: Dict[Tuple[str, str], List[Tuple[str, str]]] = defaultdict(list)
+        for provider, model, description, itinerary in entries:
+            by_namespace[(provider, model)].append((description, itinerary))
+        
+        return sum(
+            self._semantic_cache.warm(namespace, pairs)
+            for namespace, pairs in by_namespace.items()
+        )
+    
+    def get_available_providers(self, refresh: bool = False) -> Tuple[Mapping[str, Any], ...]:
+        """Get available providers and their models based on API keys (read-only, cached)."""
+        if refresh:
+            self._providers_cache = self._compute_providers()
+        return self._providers_cache
+    
+    @staticmethod
+    def _compute_providers() -> Tuple[Mapping[str, Any], ...]:
+        """Select the providers whose API key is set and client library is installed."""
+        return tuple(
+            info for api_key_env, client, info in _PROVIDER_CATALOG
+            if client and os.getenv(api_key_env)
+        )
+
+    def _create_llm(self, provider: str, model: str) -> BaseChatModel:
+        """Get the LLM instance for a provider and model, creating it on first use."""
+        cache_key = (provider, model)
+        llm = self._llm_cache.get(cache_key)
+        if llm is None:
+            # Sync calls may run on threadpool workers; build each client only once
+            with self._llm_lock:
+                llm = self._llm_cache.get(cache_key)
+                if llm is None:
+                    llm = self._build_llm(provider, model)
+                    self._llm_cache[cache_key] = llm
+        return llm
+
+    def _build_llm(self, provider: str, model: str) -> BaseChatModel:
         """Create LLM instance based on provider and model."""
         if provider == "cerebras":
             if not os.getenv("CEREBRAS_API_KEY"):
                 raise ValueError("CEREBRAS_API_KEY not found")
-            return ChatCerebras(model=model, temperature=0.7)
+            return ChatCerebras(model=model, temperature=LLM_TEMPERATURE, http_async_client=_HTTPX)
             
         elif provider == "openai":
             if not ChatOpenAI:
                 raise ValueError("langchain-openai not installed")
             if not os.getenv("OPENAI_API_KEY"):
                 raise ValueError("OPENAI_API_KEY not found")
-            return ChatOpenAI(model=model, temperature=0.7)
+            return ChatOpenAI(
+                model=model,
+                temperature=LLM_TEMPERATURE,
+                http_async_client=_HTTPX,
+                model_kwargs={"prompt_cache_key": _PROMPT_CACHE_KEY}
+            )
             
         elif provider == "groq":
             if not ChatGroq:
                 raise ValueError("langchain-groq not installed")
             if not os.getenv("GROQ_API_KEY"):
                 raise ValueError("GROQ_API_KEY not found")
-            return ChatGroq(model=model, temperature=0.7)
+            return ChatGroq(model=model, temperature=LLM_TEMPERATURE, http_async_client=_HTTPX)
             
         else:
             raise ValueError(f"Provider '{provider}' not supported or configured")
 
-    def generate_itinerary(self, user_description: str, provider: str = "cerebras", model: str = "llama-3.3-70b") -> str:
+    @staticmethod
+    def _response_cache_key(provider: str, model: str, messages: list) -> str:
+        """Stable hash of everything that determines the model's output."""
+        payload = json.dumps(
+            [provider, model, LLM_TEMPERATURE, [(m.type, m.content) for m in messages]],
+            sort_keys=True
+        )
+        return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+    
+    def _cache_key_for(self, provider: str, model: str, messages: list, cache: Optional[bool]) -> Optional[str]:
+        """Cache key for a request, or None when response caching is off for it."""
+        if cache is None:
+            cache = RESPONSE_CACHE_ENABLED
+        return self._response_cache_key(provider, model, messages) if cache else None
+    
+    def _get_cached_response(self, key: str) -> Optional[str]:
+        """Look up a cached response, marking it as recently used."""
+        with self._response_cache_lock:
+            content = self._response_cache.get(key)
+            if content is not None:
+                self._response_cache.move_to_end(key)
+            return content
+    
+    def _cache_response(self, key: str, content: str) -> None:
+        """Store a response, evicting the least recently used entry when full."""
+        with self._response_cache_lock:
+            self._response_cache[key] = content
+            self._response_cache.move_to_end(key)
+            if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+                self._response_cache.popitem(last=False)
+    
+    def _invoke(self, provider: str, model: str, messages: list, cache: Optional[bool]) -> str:
+        """Call the LLM, serving exact repeats from the response cache when enabled."""
+        llm = self._create_llm(provider, model)
+        
+        key = self._cache_key_for(provider, model, messages, cache)
+        if key is not None:
+            cached = self._get_cached_response(key)
+            if cached is not None:
+                return cached
+        
+        content = "".join(self._stream(llm, messages))
+        if key is not None:
+            self._cache_response(key, content)
+        return content
+    
+    async def _ainvoke(self, provider: str, model: str, messages: list, cache: Optional[bool]) -> str:
+        """Async counterpart of _invoke."""
+        llm = self._create_llm(provider, model)
+        
+        key = self._cache_key_for(provider, model, messages, cache)
+        if key is not None:
+            cached = self._get_cached_response(key)
+            if cached is not None:
+                return cached
+        
+        response = await llm.ainvoke(messages)
+        if key is not None:
+            self._cache_response(key, response.content)
+        return response.content
+    
+    def generate_itinerary(self, user_description: str, provider: str = "cerebras", model: str = "llama-3.3-70b", cache: Optional[bool] = None) -> str:
         """
         Generate an initial itinerary based on user description.
+        
+        `cache` overrides whether identical requests may be served from the response cache.
+        """
+        embedding = None
+        if self._semantic_cache is not None:
+            cached, embedding = self._semantic_cache.lookup((provider, model), user_description)
+            if cached is not None:
+                return cached
+        
+        messages = self._build_generation_messages(user_description)
+        
+        content = self._invoke(provider, model, messages, cache)
+        if embedding is not None:
+            self._semantic_cache.insert((provider, model), embedding, content)
+        return content
+    
+    async def agenerate_itinerary(self, user_description: str, provider: str = "cerebras", model: str = "llama-3.3-70b", cache: Optional[bool] = None) -> str:
+        """
+        Generate an initial itinerary without blocking the event loop.
+        """
+        embedding = None
+        if self._semantic_cache is not None:
+            # Embedding is CPU-bound, keep it off the event loop
+            cached, embedding = await asyncio.to_thread(
+                self._semantic_cache.lookup, (provider, model), user_description
+            )
+            if cached is not None:
+                return cached
+        
+        messages = self._build_generation_messages(user_description)
+        
+        content = await self._ainvoke(provider, model, messages, cache)
+        if embedding is not None:
+            # Shares the cache lock with lookups running on worker threads
+            await asyncio.to_thread(self._semantic_cache.insert, (provider, model), embedding, content)
+        return content
+    
+    def compare_providers(self, user_description: str, specs: List[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+        """
+        Generate itineraries for the same description from several (provider, model) pairs.
+        
+        Each provider runs on its own thread (the calls are I/O-bound), so total latency
+        is that of the slowest provider.
+        """
+        if not specs:
+            return {}
+        
+        with ThreadPoolExecutor(max_workers=len(specs)) as pool:
+            futures = {
+                (provider, model): pool.submit(self.generate_itinerary, user_description, provider, model)
+                for provider, model in specs
+            }
+            return {spec: future.result() for spec, future in futures.items()}
+    
+    async def acompare_providers(self, user_description: str, specs: List[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+        """
+        Generate itineraries for the same description from several (provider, model) pairs.
+        
+        Requests run concurrently, so total latency is that of the slowest provider.
+        """
+        results = await asyncio.gather(*[
+            self.agenerate_itinerary(user_description, provider, model)
+            for provider, model in specs
+        ])
+        return dict(zip(specs, results))
+    
+    def astream_itinerary(self, user_description: str, provider: str = "cerebras", model: str = "llama-3.3-70b") -> AsyncIterator[str]:
+        """
+        Stream an initial itinerary as text chunks while the model generates it.
+        
+        The LLM is resolved eagerly so configuration errors raise before streaming starts.
         """
         llm = self._create_llm(provider, model)
         
-        messages = [
-            SystemMessage(content=self.system_prompt),
-            HumanMessage(content=user_description)
-        ]
+        messages = self._build_generation_messages(user_description)
         
-        response = llm.invoke(messages)
-        return response.content
+        return self._astream(llm, messages)
     
-    def refine_itinerary(self, refinement_prompt: str, history: list, provider: str = "cerebras", model: str = "llama-3.3-70b") -> str:
+    def stream_itinerary(self, user_description: str, provider: str = "cerebras", model: str = "llama-3.3-70b") -> Iterator[str]:
         """
-        Refine an itinerary based on user feedback with conversation history.
+        Stream an initial itinerary as text chunks (synchronous counterpart of astream_itinerary).
         """
         llm = self._create_llm(provider, model)
         
-        messages = [SystemMessage(content=self.system_prompt)]
+        messages = self._build_generation_messages(user_description)
+        
+        return self._stream(llm, messages)
+    
+    @staticmethod
+    def _stream(llm, messages: list) -> Iterator[str]:
+        """Yield non-empty content chunks from an LLM stream."""
+        for chunk in llm.stream(messages):
+            if chunk.content:
+                yield chunk.content
+    
+    @staticmethod
+    async def _astream(llm, messages: list) -> AsyncIterator[str]:
+        """Yield non-empty content chunks from an async LLM stream."""
+        async for chunk in llm.astream(messages):
+            if chunk.content:
+                yield chunk.content
+    
+    @staticmethod
+    def _build_generation_messages(user_description: str) -> list:
+        """Build the message list for an initial itinerary request."""
+        return [_SYSTEM_MSG, HumanMessage(content=user_description)]
+    
+    @staticmethod
+    def _compact_history(history: list, max_messages: int = MAX_HISTORY_MESSAGES, max_chars: int = MAX_HISTORY_CHARS) -> list:
+        """
+        Bound the history sent to the LLM.
+        
+        The most recent messages are kept verbatim while they fit in max_messages and
+        max_chars characters (the latest message is always kept). Older assistant turns
+        are superseded by the latest itinerary and dropped; older user requests are kept
+        as a "[Summary of prior turns]" user message so their intent is not lost. When the
+        kept window starts on a user turn the summary is merged into it, so user and
+        assistant messages still alternate.
+        """
+        recent = []
+        used_chars = 0
+        for item in reversed(history):
+            if recent and (len(recent) >= max_messages or used_chars + len(item["content"]) > max_chars):
+                break
+            recent.append(item)
+            used_chars += len(item["content"])
+        recent.reverse()
+        
+        older = history[:len(history) - len(recent)]
+        requests = [item["content"] for item in older if item["role"] == "user"]
+        if not requests:
+            return recent
+        
+        summary = "[Summary of prior turns]: Earlier requests and feedback:\n- " + "\n- ".join(requests)
+        summary = summary[:MAX_SUMMARY_CHARS]
+        if recent[0]["role"] == "user":
+            return [{"role": "user", "content": f"{summary}\n\n{recent[0]['content']}"}] + recent[1:]
+        return [{"role": "user", "content": summary}] + recent
+    
+    @staticmethod
+    def _build_refinement_messages(refinement_prompt: str, history: list) -> list:
+        """
+        Build the message list for a refinement request.
+        
+        Layout is always: static system prompt, prior turns as HumanMessage/AIMessage,
+        then the new refinement prompt. Nothing dynamic goes into the system prompt,
+        so the cacheable prefix stays identical across requests and sessions.
+        """
+        messages = [_SYSTEM_MSG]
         
-        # Add conversation history
-        for item in history:
+        # Add compacted conversation history
+        for item in LLMService._compact_history(history):
             if item["role"] == "user":
                 messages.append(HumanMessage(content=item["content"]))
             else:
-                messages.append(SystemMessage(content=item["content"]))
+                messages.append(AIMessage(content=item["content"]))
         
         # Add refinement prompt
         messages.append(HumanMessage(content=refinement_prompt))
-        
-        response = llm.invoke(messages)
-        return response.content
+        return messages
+    
+    def refine_itinerary(self, refinement_prompt: str, history: list, provider: str = "cerebras", model: str = "llama-3.3-70b", cache: Optional[bool] = None) -> str:
+        """
+        Refine an itinerary based on user feedback with conversation history.
+        """
+        messages = self._build_refinement_messages(refinement_prompt, history)
+        return self._invoke(provider, model, messages, cache)
+    
+    async def arefine_itinerary(self, refinement_prompt: str, history: list, provider: str = "cerebras", model: str = "llama-3.3-70b", cache: Optional[bool] = None) -> str:
+        """
+        Refine an itinerary without blocking the event loop.
+        """
+        messages = self._build_refinement_messages(refinement_prompt, history)
+        return await self._ainvoke(provider, model, messages, cache)
+    
+    def stream_refinement(self, refinement_prompt: str, history: list, provider: str = "cerebras", model: str = "llama-3.3-70b") -> Iterator[str]:
+        """
+        Stream a refined itinerary as text chunks.
+        """
+        llm = self._create_llm(provider, model)
+        messages = self._build_refinement_messages(refinement_prompt, history)
+        return self._stream(llm, messages)
+    
+    def astream_refinement(self, refinement_prompt: str, history: list, provider: str = "cerebras", model: str = "llama-3.3-70b") -> AsyncIterator[str]:
+        """
+        Stream a refined itinerary as text chunks without blocking the event loop.
+        """
+        llm = self._create_llm(provider, model)
+        messages = self._build_refinement_messages(refinement_prompt, history)
+        return self._astream(llm, messages)
     
     @staticmethod
-    def save_to_file(filename: str, content: str) -> None:
-        """Save itinerary to a file."""
+    async def save_to_file(filename: str, content: str) -> None:
+        """Save itinerary to a file without blocking the event loop."""
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(content)
+            async with aiofiles.open(filename, 'w', encoding='utf-8') as f:
+                await f.write(content)
             print(f"✅ Itinerary saved to: {filename}")
         except Exception as e:
             print(f"❌ Error saving file: {e}")
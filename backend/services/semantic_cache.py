@@ -0,0 +1,294 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Optional dependency (pulled in by sentence-transformers). sentence-transformers
+# itself loads torch, so it is only imported once a SemanticCache is created.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+INITIAL_CAPACITY = 256
+
+# Texts per encoder forward pass when embedding in bulk
+EMBED_BATCH_SIZE = 64
+
+# Recently computed embeddings kept to avoid re-encoding repeated texts
+EMBEDDING_MEMO_SIZE = 4096
+
+# Rows dequantized per step of a scan, bounding the temporary float32 buffer
+SCAN_CHUNK_ROWS = 8192
+
+# Entries kept per (provider, model) before the oldest are evicted
+DEFAULT_MAX_ENTRIES = 5000
+
+# When a store is full, this fraction (1/N) of its oldest entries is evicted at once
+EVICT_FRACTION = 8
+
+# Below this many entries a single BLAS matrix-vector product beats a faiss index
+FAISS_MIN_ENTRIES = 50_000
+
+
+@lru_cache(maxsize=None)
+def _load_faiss():
+    """Import faiss on first use; only very large caches need it (pip install faiss-cpu)."""
+    try:
+        import faiss
+    except ImportError:
+        return None
+    return faiss
+
+
+def _quantize(vector: "np.ndarray") -> Tuple["np.ndarray", float]:
+    """Symmetric int8 quantization with a per-vector scale."""
+    scale = float(np.abs(vector).max()) / 127 or 1.0
+    return np.round(vector / scale).astype(np.int8), scale
+
+
+class _VectorStore:
+    """
+    Unit-length embeddings and their responses for one (provider, model) namespace.
+
+    Holds at most `max_entries` rows; once full, the oldest rows are evicted first.
+    Each response is stored once, so re-inserting an itinerary that is already cached
+    (an exact-cache or semantic hit) is a no-op.
+
+    Embeddings are float32 by default. With `quantize=True` they are stored as int8
+    with a float16 scale per row: about a quarter of the memory, but each scan has
+    to convert rows back to float32, so lookups are roughly 2x slower. Cosine error
+    from quantization is well below the gap that matters at a 0.92 threshold.
+    """
+
+    def __init__(self, dim: int, max_entries: int, quantize: bool = False):
+        capacity = min(INITIAL_CAPACITY, max_entries)
+        self._max_entries = max_entries
+        self._quantized = quantize
+        self._emb = np.empty((capacity, dim), dtype=np.int8 if quantize else np.float32)
+        self._scales = np.empty(capacity, dtype=np.float16) if quantize else None
+        self._n = 0
+        self._responses: List[str] = []
+        self._response_set: Set[str] = set()
+        self._index = None
+        # Held only to modify and to take a snapshot; scans run outside it
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._n
+
+    def add(self, embedding: "np.ndarray", response: str) -> bool:
+        """Append an embedding, growing storage by doubling. Returns False for a duplicate response."""
+        with self._lock:
+            if response in self._response_set:
+                return False
+            if self._n == self._max_entries:
+                self._evict_oldest(max(1, self._max_entries // EVICT_FRACTION))
+
+            # Response first and row count last, so a search never finds a row without its response
+            self._responses.append(response)
+            self._response_set.add(response)
+            if self._index is not None:
+                self._index.add(embedding.reshape(1, -1))
+            else:
+                if self._n == len(self._emb):
+                    self._grow()
+                if self._quantized:
+                    self._emb[self._n], self._scales[self._n] = _quantize(embedding)
+                else:
+                    self._emb[self._n] = embedding
+            self._n += 1
+
+            faiss = _load_faiss() if self._index is None and self._n > FAISS_MIN_ENTRIES else None
+            if faiss is not None:
+                self._index = faiss.IndexFlatIP(self._emb.shape[1])
+                self._index.add(self._as_float32(self._emb, self._scales, 0, self._n))
+                self._emb = self._scales = None
+            return True
+
+    def _grow(self) -> None:
+        # Copies into new arrays, so snapshots taken before growing stay valid
+        capacity = min(2 * len(self._emb), self._max_entries)
+        emb = np.empty((capacity, self._emb.shape[1]), dtype=self._emb.dtype)
+        emb[:self._n] = self._emb[:self._n]
+        if self._quantized:
+            scales = np.empty(capacity, dtype=np.float16)
+            scales[:self._n] = self._scales[:self._n]
+            self._scales = scales
+        self._emb = emb
+
+    def _evict_oldest(self, count: int) -> None:
+        # Evicting in batches keeps the copy amortized O(1) per insert
+        keep = self._n - count
+        if self._index is not None:
+            # Searched under the lock, so the index can be compacted in place
+            self._index.remove_ids(_load_faiss().IDSelectorRange(0, count))
+        else:
+            # Like _grow, copy into new arrays so in-flight snapshots stay valid
+            emb = np.empty_like(self._emb)
+            emb[:keep] = self._emb[count:self._n]
+            if self._quantized:
+                scales = np.empty_like(self._scales)
+                scales[:keep] = self._scales[count:self._n]
+                self._scales = scales
+            self._emb = emb
+
+        self._response_set.difference_update(self._responses[:count])
+        self._responses = self._responses[count:]
+        self._n = keep
+
+    @staticmethod
+    def _as_float32(emb: "np.ndarray", scales: Optional["np.ndarray"], start: int, stop: int) -> "np.ndarray":
+        if scales is None:
+            return emb[start:stop]
+        return emb[start:stop].astype(np.float32) * scales[start:stop, None]
+
+    def best_match(self, query: "np.ndarray") -> Tuple[float, str]:
+        """Return the highest cosine similarity and its response."""
+        with self._lock:
+            if self._index is not None:
+                # faiss does not support searching while another thread adds
+                scores, ids = self._index.search(query.reshape(1, -1), 1)
+                return float(scores[0][0]), self._responses[int(ids[0][0])]
+            # Rows below n are never rewritten, so scan a snapshot without the lock
+            emb, scales, n, responses = self._emb, self._scales, self._n, self._responses
+
+        if scales is None:
+            sims = emb[:n] @ query
+            best_idx = int(sims.argmax())
+            return float(sims[best_idx]), responses[best_idx]
+
+        best_score, best_idx = -1.0, 0
+        for start in range(0, n, SCAN_CHUNK_ROWS):
+            stop = min(start + SCAN_CHUNK_ROWS, n)
+            # Scale after the dot product: (q . e_i) * s_i
+            sims = (emb[start:stop].astype(np.float32) @ query) * scales[start:stop]
+            idx = int(sims.argmax())
+            if sims[idx] > best_score:
+                best_score, best_idx = float(sims[idx]), start + idx
+
+        return best_score, responses[best_idx]
+
+
+class SemanticCache:
+    """Cache of generated itineraries keyed by the meaning of the user's description."""
+
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        threshold: float = 0.92,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        quantize: bool = False
+    ):
+        """
+        Load the embedding model; raises ImportError if the optional dependencies are missing.
+
+        `max_entries` bounds each (provider, model) store, evicting the oldest entries first.
+        `quantize` stores embeddings as int8, trading slower lookups for less memory.
+        """
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ImportError("Semantic cache requires: pip install sentence-transformers") from None
+
+        self.threshold = threshold
+        self._max_entries = max_entries
+        self._quantize = quantize
+        self._encoder = SentenceTransformer(model_name)
+        self._dim = self._encoder.get_sentence_embedding_dimension()
+
+        # Separate store per (provider, model) so models never share answers
+        self._stores: Dict[Tuple[str, str], _VectorStore] = {}
+        self._memo: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        # Lookups run on worker threads; guards the memo and the store mapping
+        # (each store locks its own rows, and encoding runs unlocked)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _text_key(text: str) -> str:
+        return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+    def embed_texts(self, texts: List[str]) -> "np.ndarray":
+        """
+        Embed texts as unit-length float32 rows, in input order.
+
+        Previously seen texts come from the memo; the rest are encoded together in
+        batches, amortizing tokenizer and model call overhead.
+        """
+        keys = [self._text_key(text) for text in texts]
+        result = np.empty((len(texts), self._dim), dtype=np.float32)
+
+        uncached: Dict[str, str] = {}
+        with self._lock:
+            for row, (key, text) in enumerate(zip(keys, texts)):
+                embedding = self._memo.get(key)
+                if embedding is None:
+                    uncached[key] = text
+                else:
+                    result[row] = embedding
+                    self._memo.move_to_end(key)
+
+        if uncached:
+            encoded = self._encoder.encode(
+                list(uncached.values()),
+                batch_size=EMBED_BATCH_SIZE,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            ).astype(np.float32)
+            fresh = dict(zip(uncached, encoded))
+
+            for row, key in enumerate(keys):
+                if key in fresh:
+                    result[row] = fresh[key]
+
+            with self._lock:
+                self._memo.update(fresh)
+                while len(self._memo) > EMBEDDING_MEMO_SIZE:
+                    self._memo.popitem(last=False)
+
+        return result
+
+    def embed(self, text: str) -> "np.ndarray":
+        """Embed a text as a unit-length float32 vector."""
+        return self.embed_texts([text])[0]
+
+    def lookup(self, namespace: Tuple[str, str], text: str) -> Tuple[Optional[str], "np.ndarray"]:
+        """
+        Find a cached response for a similar text.
+
+        Returns the response (or None on a miss) together with the text's embedding,
+        so a miss can be inserted without embedding twice.
+        """
+        embedding = self.embed(text)
+
+        with self._lock:
+            store = self._stores.get(namespace)
+
+        if store is not None and len(store):
+            # Vectors are normalized, so the dot product is cosine similarity
+            score, response = store.best_match(embedding)
+            if score >= self.threshold:
+                return response, embedding
+
+        return None, embedding
+
+    def insert(self, namespace: Tuple[str, str], embedding: "np.ndarray", response: str) -> bool:
+        """Store a response under a previously computed embedding. Returns False if it was already cached."""
+        with self._lock:
+            store = self._stores.get(namespace)
+            if store is None:
+                store = self._stores[namespace] = _VectorStore(self._dim, self._max_entries, self._quantize)
+        return store.add(embedding, response)
+
+    def warm(self, namespace: Tuple[str, str], entries: Iterable[Tuple[str, str]]) -> int:
+        """Bulk-load (text, response) pairs, e.g. from stored sessions. Returns the count added (duplicates are skipped)."""
+        entries = list(entries)
+        if not entries:
+            return 0
+
+        embeddings = self.embed_texts([text for text, _ in entries])
+        return sum(
+            self.insert(namespace, embedding, response)
+            for embedding, (_, response) in zip(embeddings, entries)
+        )
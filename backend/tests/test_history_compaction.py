@@ -0,0 +1,26 @@
+"""Compacted refinement history must keep user and assistant messages alternating."""
+from services.llm_service import LLMService
+
+
+def _history(turns: int, chars: int) -> list:
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"request {i} " + "x" * chars})
+        history.append({"role": "assistant", "content": f"itinerary {i} " + "y" * chars})
+    return history
+
+
+def test_compacted_history_alternates_roles():
+    # Sizes chosen so the kept window starts on a user turn and on an assistant turn
+    for chars in (100, 1900, 2500):
+        for turns in (2, 4, 10):
+            compacted = LLMService._compact_history(_history(turns, chars))
+            roles = [item["role"] for item in compacted]
+            assert roles[0] == "user"
+            assert all(a != b for a, b in zip(roles, roles[1:])), (chars, turns, roles)
+
+
+def test_summary_keeps_earliest_request():
+    compacted = LLMService._compact_history(_history(10, 1900))
+    assert compacted[0]["content"].startswith("[Summary of prior turns]")
+    assert "request 0" in compacted[0]["content"]
@@ -0,0 +1,25 @@
+"""The system prompt must be the identical first message of every request, or provider prompt caches miss."""
+from services.llm_service import LLMService, _SYSTEM_MSG, _SYSTEM_PROMPT
+
+
+def _history(turns: int) -> list:
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"request {i} " + "x" * 500})
+        history.append({"role": "assistant", "content": f"itinerary {i} " + "y" * 3000})
+    return history
+
+
+def test_generation_messages_start_with_system_prompt():
+    for description in ("3 days in Rome", "A week hiking in Patagonia on a budget"):
+        first = LLMService._build_generation_messages(description)[0]
+        assert first is _SYSTEM_MSG
+        assert first.content == _SYSTEM_PROMPT
+
+
+def test_refinement_messages_start_with_system_prompt():
+    # Short history, and one long enough to be compacted into a summary
+    for history in ([], _history(1), _history(10)):
+        first = LLMService._build_refinement_messages("Add a rest day", history)[0]
+        assert first is _SYSTEM_MSG
+        assert first.content == _SYSTEM_PROMPT
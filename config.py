@@ -4,33 +4,28 @@ Environment variables and settings for multi-model support
 """
 
 import os
+from dataclasses import dataclass, field
 from typing import Dict, List, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
+@dataclass(slots=True, frozen=True)
 class ModelProviderConfig:
     """Configuration for a single model provider"""
     
-    def __init__(
-        self,
-        provider: str,
-        name: str,
-        api_key_env: str,
-        default_model: Optional[str] = None,
-        models: Optional[List[str]] = None,
-        base_url: Optional[str] = None,
-        enabled: bool = False
-    ):
-        self.provider = provider
-        self.name = name
-        self.api_key_env = api_key_env
-        self.api_key = os.getenv(api_key_env, "")
-        self.default_model = default_model
-        self.models = models or []
-        self.base_url = base_url
-        self.enabled = enabled and bool(self.api_key)
+    provider: str
+    name: str
+    api_key: str = field(repr=False)
+    default_model: str | None = None
+    models: tuple[str, ...] = ()
+    base_url: str | None = None
+    enabled: bool = False
+    
+    def __post_init__(self):
+        # A provider is only usable when its API key is configured
+        object.__setattr__(self, "enabled", self.enabled and bool(self.api_key))
 
 
 class Settings:
@@ -73,9 +68,9 @@ class Settings:
             "google_genai": ModelProviderConfig(
                 provider="google_genai",
                 name="Google Gemini",
-                api_key_env="GEMINI_API_KEY",
+                api_key=self.GEMINI_API_KEY,
                 default_model="gemini-2.0-flash",
-                models=["gemini-2.0-flash", "gemini-1.5-pro", "gemini-1.5-flash"],
+                models=("gemini-2.0-flash", "gemini-1.5-pro", "gemini-1.5-flash"),
                 enabled=True
             ),
             
@@ -83,9 +78,9 @@ class Settings:
             "openai": ModelProviderConfig(
                 provider="openai",
                 name="OpenAI",
-                api_key_env="OPENAI_API_KEY",
+                api_key=self.OPENAI_API_KEY,
                 default_model="gpt-4o",
-                models=["gpt-4o", "gpt-4-turbo", "gpt-3.5-turbo"],
+                models=("gpt-4o", "gpt-4-turbo", "gpt-3.5-turbo"),
                 enabled=True
             ),
             
@@ -93,9 +88,9 @@ class Settings:
             "anthropic": ModelProviderConfig(
                 provider="anthropic",
                 name="Anthropic Claude",
-                api_key_env="ANTHROPIC_API_KEY",
+                api_key=self.ANTHROPIC_API_KEY,
                 default_model="claude-3-5-sonnet-20241022",
-                models=["claude-3-5-sonnet-20241022", "claude-3-opus-20240229", "claude-3-haiku-20240307"],
+                models=("claude-3-5-sonnet-20241022", "claude-3-opus-20240229", "claude-3-haiku-20240307"),
                 enabled=True
             ),
             
@@ -103,9 +98,9 @@ class Settings:
             "groq": ModelProviderConfig(
                 provider="groq",
                 name="Groq",
-                api_key_env="GROQ_API_KEY",
+                api_key=self.GROQ_API_KEY,
                 default_model="mixtral-8x7b-32768",
-                models=["mixtral-8x7b-32768", "llama2-70b-4096"],
+                models=("mixtral-8x7b-32768", "llama2-70b-4096"),
                 enabled=True
             ),
             
@@ -113,9 +108,9 @@ class Settings:
             "mistral": ModelProviderConfig(
                 provider="mistral",
                 name="Mistral AI",
-                api_key_env="MISTRAL_API_KEY",
+                api_key=self.MISTRAL_API_KEY,
                 default_model="mistral-large-latest",
-                models=["mistral-large-latest", "mistral-medium-latest", "mistral-small-latest"],
+                models=("mistral-large-latest", "mistral-medium-latest", "mistral-small-latest"),
                 enabled=True
             ),
             
@@ -123,9 +118,9 @@ class Settings:
             "cohere": ModelProviderConfig(
                 provider="cohere",
                 name="Cohere",
-                api_key_env="COHERE_API_KEY",
+                api_key=self.COHERE_API_KEY,
                 default_model="command-r-plus",
-                models=["command-r-plus", "command-r"],
+                models=("command-r-plus", "command-r"),
                 enabled=True
             ),
             
@@ -133,9 +128,9 @@ class Settings:
             "cerebras": ModelProviderConfig(
                 provider="cerebras",
                 name="Cerebras",
-                api_key_env="CEREBRAS_API_KEY",
+                api_key=self.CEREBRAS_API_KEY,
                 default_model="llama-3.3-70b",
-                models=["llama-3.3-70b", "llama-3.1-70b", "llama-3.1-8b"],
+                models=("llama-3.3-70b", "llama-3.1-70b", "llama-3.1-8b"),
                 enabled=True
             ),
         }
@@ -161,31 +156,13 @@ class Settings:
     def list_available_models(self, provider: str) -> List[str]:
         """List available models for a specific provider"""
         config = self.get_provider_config(provider)
-        return config.models if config else []
+        return list(config.models) if config else []
 
 
 # Initialize settings
 settings = Settings()
 
-# Set environment variables for all configured API keys
+# Provider clients read their keys from the environment (populated by load_dotenv);
+# only the Gemini key needs exposing under the name langchain-google-genai expects
 if settings.GEMINI_API_KEY:
-    os.environ["GEMINI_API_KEY"] = settings.GEMINI_API_KEY
-    os.environ["GOOGLE_API_KEY"] = settings.GEMINI_API_KEY
-
-if settings.OPENAI_API_KEY:
-    os.environ["OPENAI_API_KEY"] = settings.OPENAI_API_KEY
-
-if settings.ANTHROPIC_API_KEY:
-    os.environ["ANTHROPIC_API_KEY"] = settings.ANTHROPIC_API_KEY
-
-if settings.GROQ_API_KEY:
-    os.environ["GROQ_API_KEY"] = settings.GROQ_API_KEY
-
-if settings.MISTRAL_API_KEY:
-    os.environ["MISTRAL_API_KEY"] = settings.MISTRAL_API_KEY
-
-if settings.COHERE_API_KEY:
-    os.environ["COHERE_API_KEY"] = settings.COHERE_API_KEY
-
-if settings.CEREBRAS_API_KEY:
-    os.environ["CEREBRAS_API_KEY"] = settings.CEREBRAS_API_KEY
\ No newline at end of file
+    os.environ.setdefault("GOOGLE_API_KEY", settings.GEMINI_API_KEY)
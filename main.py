@@ -1,22 +1,14 @@
 from dotenv import load_dotenv
 load_dotenv()
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Final
 from langchain_cerebras import ChatCerebras
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 
 
-def create_holiday_planner():
-    """Initialize the Cerebras chat model for holiday planning."""
-    llm = ChatCerebras(
-        model="llama-3.3-70b",
-        temperature=0.7,    
-    )
-    return llm
-
-
-def create_system_prompt():
-    """Create a specialized system prompt for holiday planning."""
-    return """You are an expert travel and holiday planner with extensive knowledge of destinations around the world. 
+SYSTEM_PROMPT: Final[str] = """You are an expert travel and holiday planner with extensive knowledge of destinations around the world. 
 Your role is to create detailed, personalized itineraries based on user preferences.
 
 When creating an itinerary, you should:
@@ -34,74 +26,146 @@ Format your response clearly with sections for each day, and include a summary s
 
 IMPORTANT: At the end of your itinerary, add a section called "FOLLOW-UP QUESTIONS" with 3-4 specific questions that would help refine the itinerary further. Format these questions clearly for user input."""
 
+# Built once so every request sends a byte-identical system prompt
+SYSTEM_MESSAGE: Final = SystemMessage(content=SYSTEM_PROMPT)
+
+# Keep at most this many user/assistant turns in the conversation.
+# Older turns are dropped from the front, but the leading system prompt is
+# always kept so the cached prompt prefix stays valid.
+CACHE_RESET_THRESHOLD = 4
+
+# Spaces and characters not allowed in filenames, replaced in a single pass
+_SAFE_FILENAME_TRANS = str.maketrans({ch: "_" for ch in ' /\\:*?"<>|'})
+
+# Streamed text is written to stdout in batches of at least this many characters
+STDOUT_BATCH_CHARS = 1024
+
+# Background writer so saving never blocks the chat loop
+_io_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="itinerary-io")
+
+# (filename, future) for saves not yet reported; results are printed from the
+# main thread so they never interleave with an input() prompt
+_pending_saves = []
+
+
+def create_holiday_planner():
+    """Initialize the Cerebras chat model for holiday planning."""
+    llm = ChatCerebras(
+        model="llama-3.3-70b",
+        temperature=0.7,    
+    )
+    return llm
+
 
-def generate_itinerary(llm, user_prompt, conversation_history):
-    """Generate itinerary with streaming output."""
+def new_conversation():
+    """Start a message list holding just the system prompt."""
+    return [SYSTEM_MESSAGE]
+
+
+def stream_to_stdout(llm, messages):
+    """Stream a reply to stdout and return the full text.
+    
+    Chunks are batched into writes of STDOUT_BATCH_CHARS rather than flushed
+    per token, then flushed once at the end of the stream.
+    """
+    parts = []
+    pending = []
+    pending_chars = 0
+    
+    for chunk in llm.stream(messages):
+        parts.append(chunk.content)
+        pending.append(chunk.content)
+        pending_chars += len(chunk.content)
+        if pending_chars >= STDOUT_BATCH_CHARS:
+            sys.stdout.write("".join(pending))
+            pending.clear()
+            pending_chars = 0
+    
+    sys.stdout.write("".join(pending))
+    sys.stdout.flush()
+    return "".join(parts)
+
+
+def generate_itinerary(llm, user_prompt, messages):
+    """Generate itinerary with streaming output.
     
-    system_message = SystemMessage(content=create_system_prompt())
+    The prompt and the reply are appended to `messages` in place.
+    """
     
-    # Build messages with conversation history
-    messages = [system_message] + conversation_history + [HumanMessage(content=user_prompt)]
+    messages.append(HumanMessage(content=user_prompt))
     
     print("\n" + "="*60)
     print("✈️  GENERATING YOUR PERSONALIZED ITINERARY...")
     print("="*60 + "\n")
     
-    full_response = ""
-    
-    # Stream the response
-    for chunk in llm.stream(messages):
-        print(chunk.content, end="", flush=True)
-        full_response += chunk.content
+    full_response = stream_to_stdout(llm, messages)
     
     print("\n\n" + "="*60)
     print("✅ Itinerary Generation Complete!")
     print("="*60)
     
+    messages.append(AIMessage(content=full_response))
     return full_response
 
 
-def refine_itinerary(llm, refinement_prompt, conversation_history):
-    """Refine the itinerary based on user feedback."""
+def refine_itinerary(llm, refinement_prompt, messages):
+    """Refine the itinerary based on user feedback.
     
-    system_message = SystemMessage(content=create_system_prompt())
+    The prompt and the reply are appended to `messages` in place.
+    """
     
-    # Build messages with conversation history
-    messages = [system_message] + conversation_history + [HumanMessage(content=refinement_prompt)]
+    messages.append(HumanMessage(content=refinement_prompt))
     
     print("\n" + "="*60)
     print("🔄 REFINING YOUR ITINERARY...")
     print("="*60 + "\n")
     
-    full_response = ""
-    
-    # Stream the response
-    for chunk in llm.stream(messages):
-        print(chunk.content, end="", flush=True)
-        full_response += chunk.content
+    full_response = stream_to_stdout(llm, messages)
     
     print("\n\n" + "="*60)
     print("✅ Itinerary Refinement Complete!")
     print("="*60)
     
+    messages.append(AIMessage(content=full_response))
     return full_response
 
 
+def trim_history(messages):
+    """Drop the oldest user/assistant pairs beyond CACHE_RESET_THRESHOLD turns, keeping the system prompt."""
+    excess = len(messages) - 1 - 2 * CACHE_RESET_THRESHOLD
+    if excess > 0:
+        del messages[1:1 + excess]
+
+
 def save_itinerary(filename, itinerary_content):
-    """Save the generated itinerary to a file."""
-    try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(itinerary_content)
-        print(f"\n💾 Itinerary saved to: {filename}")
-    except Exception as e:
-        print(f"\n⚠️  Could not save file: {e}")
+    """Save the generated itinerary to a file in the background."""
+    future = _io_executor.submit(_write_itinerary, filename, itinerary_content)
+    _pending_saves.append((filename, future))
+
+
+def _write_itinerary(filename, itinerary_content):
+    """Write the itinerary to disk."""
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write(itinerary_content)
+
+
+def report_saves():
+    """Print the outcome of background saves that have finished."""
+    for filename, future in list(_pending_saves):
+        if not future.done():
+            continue
+        _pending_saves.remove((filename, future))
+        error = future.exception()
+        if error is None:
+            print(f"\n💾 Itinerary saved to: {filename}")
+        else:
+            print(f"\n⚠️  Could not save file: {error}")
 
 
 def get_safe_filename(user_input):
     """Generate a safe filename from user input."""
-    # Take first 30 chars and replace spaces with underscores
-    safe_name = user_input[:30].replace(" ", "_").replace("/", "_").replace("\\", "_")
-    return f"itinerary_{safe_name}.txt"
+    # Take first 30 chars and replace spaces and filesystem-unsafe characters with underscores
+    return f"itinerary_{user_input[:30].translate(_SAFE_FILENAME_TRANS)}.txt"
 
 
 def main():
@@ -128,8 +192,8 @@ def main():
         print("  • Interests and activities")
         print("  • Any specific preferences\n")
         
-        # Conversation history for multi-turn context
-        conversation_history = []
+        # Conversation messages for multi-turn context (system prompt first, append-only)
+        messages = new_conversation()
         itinerary_filename = None
         
         # First prompt from user
@@ -139,17 +203,15 @@ def main():
             return
         
         # Generate initial itinerary
-        response = generate_itinerary(llm, user_prompt, conversation_history)
-        
-        # Add to conversation history
-        conversation_history.append(HumanMessage(content=user_prompt))
-        conversation_history.append(SystemMessage(content=response))
+        response = generate_itinerary(llm, user_prompt, messages)
         
         # Generate filename from user input
         itinerary_filename = get_safe_filename(user_prompt)
         
         # Refinement loop
         while True:
+            report_saves()
+            
             print("\n" + "-"*60)
             print("What would you like to do?")
             print("  1. Answer follow-up questions to refine")
@@ -166,11 +228,8 @@ def main():
                     # Create refinement prompt that maintains context
                     refinement_prompt = f"Based on my previous request and your itinerary, here's my feedback/answer: {refinement_input}\n\nPlease refine the itinerary accordingly and include updated FOLLOW-UP QUESTIONS at the end."
                     
-                    response = refine_itinerary(llm, refinement_prompt, conversation_history)
-                    
-                    # Add to conversation history
-                    conversation_history.append(HumanMessage(content=refinement_prompt))
-                    conversation_history.append(SystemMessage(content=response))
+                    response = refine_itinerary(llm, refinement_prompt, messages)
+                    trim_history(messages)
                 else:
                     print("⚠️  Please provide feedback or answers to refine the itinerary.")
             
@@ -179,16 +238,14 @@ def main():
             
             elif choice == "3":
                 print("\n🔄 Starting over...\n")
-                conversation_history = []
+                messages = new_conversation()
                 
                 user_prompt = input("📝 Describe your ideal holiday: ").strip()
                 if not user_prompt:
                     print("❌ Please provide holiday details to continue.")
                     continue
                 
-                response = generate_itinerary(llm, user_prompt, conversation_history)
-                conversation_history.append(HumanMessage(content=user_prompt))
-                conversation_history.append(SystemMessage(content=response))
+                response = generate_itinerary(llm, user_prompt, messages)
                 itinerary_filename = get_safe_filename(user_prompt)
             
             elif choice == "4":
@@ -201,6 +258,11 @@ def main():
     except Exception as e:
         print(f"\n❌ Error: {str(e)}")
         print("Please ensure your Cerebras API key is valid and you have internet connectivity.")
+    
+    finally:
+        # Let pending saves finish before exiting
+        _io_executor.shutdown(wait=True)
+        report_saves()
 
 
 if __name__ == "__main__":
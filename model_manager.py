@@ -2,19 +2,41 @@
 Model Manager for handling multiple AI providers
 """
 
-from typing import Optional, List, Dict
-from langchain_cerebras import ChatCerebras
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_groq import ChatGroq
-from langchain_mistralai import ChatMistral
-from langchain_cohere import ChatCohere
+import importlib
+from typing import Optional, List, Dict, Type
 from langchain_core.language_models import BaseChatModel
 
 from config import settings, ModelProviderConfig
 
 
+# Provider -> (module, chat model class). Imported lazily so only the
+# providers actually used pay their import cost.
+PROVIDER_CLASSES: Dict[str, tuple] = {
+    "cerebras": ("langchain_cerebras", "ChatCerebras"),
+    "openai": ("langchain_openai", "ChatOpenAI"),
+    "anthropic": ("langchain_anthropic", "ChatAnthropic"),
+    "google_genai": ("langchain_google_genai", "ChatGoogleGenerativeAI"),
+    "groq": ("langchain_groq", "ChatGroq"),
+    "mistral": ("langchain_mistralai", "ChatMistralAI"),
+    "cohere": ("langchain_cohere", "ChatCohere"),
+}
+
+
+def load_chat_model_class(provider: str) -> Type[BaseChatModel]:
+    """Import and return the chat model class for a provider"""
+    if provider not in PROVIDER_CLASSES:
+        raise ValueError(f"Unsupported provider: {provider}")
+    
+    module_name, class_name = PROVIDER_CLASSES[provider]
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError:
+        package = module_name.replace("_", "-")
+        raise ValueError(f"{package} not installed. Run: pip install {package}")
+    
+    return getattr(module, class_name)
+
+
 class ModelManager:
     """Manages initialization and switching between different AI models"""
     
@@ -75,57 +97,12 @@ class ModelManager:
     ) -> BaseChatModel:
         """Create LLM instance based on provider"""
         
-        if provider == "cerebras":
-            return ChatCerebras(
-                model=model,
-                temperature=temperature,
-                max_tokens=max_tokens,
-            )
-        
-        elif provider == "openai":
-            return ChatOpenAI(
-                model=model,
-                temperature=temperature,
-                max_tokens=max_tokens,
-            )
-        
-        elif provider == "anthropic":
-            return ChatAnthropic(
-                model=model,
-                temperature=temperature,
-                max_tokens=max_tokens,
-            )
-        
-        elif provider == "google_genai":
-            return ChatGoogleGenerativeAI(
-                model=model,
-                temperature=temperature,
-                max_tokens=max_tokens,
-            )
-        
-        elif provider == "groq":
-            return ChatGroq(
-                model=model,
-                temperature=temperature,
-                max_tokens=max_tokens,
-            )
-        
-        elif provider == "mistral":
-            return ChatMistral(
-                model=model,
-                temperature=temperature,
-                max_tokens=max_tokens,
-            )
-        
-        elif provider == "cohere":
-            return ChatCohere(
-                model=model,
-                temperature=temperature,
-                max_tokens=max_tokens,
-            )
-        
-        else:
-            raise ValueError(f"Unsupported provider: {provider}")
+        chat_model_class = load_chat_model_class(provider)
+        return chat_model_class(
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
     
     def switch_provider(self, provider: str, model: Optional[str] = None) -> BaseChatModel:
         """Switch to a different provider"""